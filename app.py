@@ -1,7 +1,10 @@
+import os
 from pathlib import Path
 import streamlit as st
+import networkx as nx
+import numpy as np
 import pandas as pd
-from pyvis.network import Network
+from jinja2 import Template
 from streamlit.components.v1 import html
 
 # ---------- Page config ----------
@@ -12,16 +15,226 @@ st.set_page_config(
 )
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
-DEFAULT_NODES = DATA_DIR / "nodes.csv"
-DEFAULT_EDGES = DATA_DIR / "edges.csv"
+DEFAULT_NODES = DATA_DIR / "nodes.parquet"
+DEFAULT_EDGES = DATA_DIR / "edges.parquet"
+
+# above this many nodes vis.js (DOM/canvas) gets choppy; hand off to the
+# WebGL renderer instead
+SIGMA_NODE_THRESHOLD = 2000
+
+# above this many nodes, collapse the graph into Louvain communities and let
+# the user drill into one at a time
+COMMUNITY_NODE_THRESHOLD = 500
+
+VIS_TEMPLATE = Template("""<!doctype html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<script src="https://cdn.jsdelivr.net/npm/vis-network@9.1.9/dist/vis-network.min.js"></script>
+<style>#vis-container { width: {{ w }}px; height: {{ h }}px; background: #ffffff; }</style>
+</head>
+<body>
+<div id="vis-container"></div>
+<script>
+  new vis.Network(
+    document.getElementById("vis-container"),
+    {nodes: new vis.DataSet({{ nodes_json }}),
+     edges: new vis.DataSet({{ edges_json }})},
+    {physics: {enabled: false}, edges: {smooth: false}, interaction: {hover: true}}
+  );
+</script>
+</body>
+</html>
+""")
+
+SIGMA_TEMPLATE = Template("""<!doctype html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<script src="https://cdn.jsdelivr.net/npm/graphology@0.25.4/dist/graphology.umd.min.js"></script>
+<script src="https://cdn.jsdelivr.net/npm/sigma@2.4.0/build/sigma.min.js"></script>
+<style>#sigma-container { width: {{ w }}px; height: {{ h }}px; background: #ffffff; }</style>
+</head>
+<body>
+<div id="sigma-container"></div>
+<script>
+  const graph = new graphology.Graph();
+  for (const n of {{ nodes_json }}) {
+    graph.addNode(n.id, {label: n.label, x: n.x, y: n.y, size: n.size, color: n.color});
+  }
+  for (const e of {{ edges_json }}) {
+    graph.mergeEdge(e.source, e.target, {size: e.size});
+  }
+  new Sigma(graph, document.getElementById("sigma-container"));
+</script>
+</body>
+</html>
+""")
 
 # ---------- Helpers ----------
 @st.cache_data
 def load_data(nodes_path: str, edges_path: str):
-    nodes = pd.read_csv(nodes_path)
-    edges = pd.read_csv(edges_path)
+    # parquet artifacts carry their dtypes (categoricals included) and load
+    # with no parsing; CSV stays supported for hand-supplied paths, with an
+    # explicit dtype map so inference never scans the file
+    if str(nodes_path).endswith(".parquet"):
+        nodes = pd.read_parquet(nodes_path)
+    else:
+        nodes = pd.read_csv(
+            nodes_path,
+            dtype={"id": "string", "label": "string", "type": "category",
+                   "contrib_type": "category", "total_amount": "float32", "tx_count": "int32"},
+        )
+    if str(edges_path).endswith(".parquet"):
+        edges = pd.read_parquet(edges_path)
+    else:
+        edges = pd.read_csv(
+            edges_path,
+            dtype={"source": "category", "target": "category", "edge_type": "category",
+                   "address": "string", "total_amount": "float32", "tx_count": "int32"},
+        )
     return nodes, edges
 
+@st.cache_data
+def precompute(nodes_path: str, edges_path: str, mtime_n: float, mtime_e: float):
+    """Filter-independent aggregations, cached until either CSV changes on disk.
+
+    The mtime arguments exist only to key the cache. Node ids are factorized
+    once, and every possible value of the min-contributors slider gets a
+    boolean lookup array over those codes, so per-rerun filtering is a single
+    fancy-index instead of hashing each id against a Python set.
+    """
+    nodes, edges = load_data(nodes_path, edges_path)
+    addr_contribs = (edges.groupby("target", observed=True)
+                     .agg(contributors=("source", "nunique")).reset_index())
+
+    id_codes, id_index = pd.factorize(nodes["id"])
+    keep_mask_by_min = {}
+    for k in range(2, 16):  # full slider range
+        keep = np.zeros(len(id_index), dtype=bool)
+        locs = id_index.get_indexer(
+            addr_contribs.loc[addr_contribs["contributors"] >= k, "target"])
+        keep[locs[locs >= 0]] = True
+        keep_mask_by_min[k] = keep
+    return dict(
+        id_codes=id_codes,
+        keep_mask_by_min=keep_mask_by_min,
+        is_addr=nodes["type"] == "address",
+        is_person=nodes["type"] == "contributor",
+    )
+
+@st.cache_data
+def build_vis_arrays(nodes_records, edges_records):
+    """Layout plus vis.js node/edge JSON arrays for this filter state.
+
+    Takes tuples-of-tuples so Streamlit can hash the inputs. Each node record
+    is (id, label, type, title); each edge record is (source, target, title,
+    tx_count). One C-level to_json pass per array replaces thousands of
+    per-node Python calls into pyvis; the precomputed positions keep physics
+    off in the browser. Cached separately from the page HTML so resizing the
+    canvas never re-serializes the graph.
+    """
+    G = nx.Graph()
+    G.add_nodes_from(r[0] for r in nodes_records)
+    G.add_edges_from((src, dst) for src, dst, _, _ in edges_records)
+    pos = nx.spring_layout(G, seed=0, iterations=50)
+
+    ndf = pd.DataFrame(nodes_records, columns=["id", "label", "type", "title"])
+    coords = np.array([pos[i] for i in ndf["id"]], dtype=float).reshape(-1, 2)
+    ndf["x"] = coords[:, 0] * 1000
+    ndf["y"] = coords[:, 1] * 1000
+    ndf["shape"] = np.where(ndf["type"] == "address", "square", "dot")
+    edf = pd.DataFrame(edges_records, columns=["from", "to", "title", "tx_count"])
+    edf["value"] = edf["tx_count"].astype(float)
+
+    return (ndf[["id", "label", "title", "shape", "x", "y"]].to_json(orient="records"),
+            edf[["from", "to", "title", "value"]].to_json(orient="records"))
+
+@st.cache_data
+def build_network_html(nodes_records, edges_records, h, w) -> str:
+    """Return the vis-network page for this filter state and canvas size."""
+    nodes_json, edges_json = build_vis_arrays(nodes_records, edges_records)
+    return VIS_TEMPLATE.render(nodes_json=nodes_json, edges_json=edges_json, h=h, w=w)
+
+@st.cache_data
+def collapse_communities(nodes_records, edges_records):
+    """Collapse a large graph into a Louvain-community meta-graph.
+
+    Projects addresses joined by shared contributors, runs Louvain on the
+    projection, and assigns each contributor to the community it touches most.
+    Returns (meta_nodes, meta_edges, node->community dict); the meta records
+    use the same tuple layout as the full graph, so either renderer can draw
+    them unchanged. Meta-edge weight is the inter-community link count.
+    """
+    B = nx.Graph()
+    B.add_edges_from((src, dst) for src, dst, _, _ in edges_records)
+    addr_ids = {r[0] for r in nodes_records if r[2] == "address" and r[0] in B}
+    P = nx.bipartite.weighted_projected_graph(B, addr_ids)
+    communities = nx.community.louvain_communities(P, weight="weight", seed=0)
+    comm_of = {n: i for i, comm in enumerate(communities) for n in comm}
+
+    touches = {}
+    for src, dst, _, _ in edges_records:
+        c = comm_of.get(dst)
+        if c is not None:
+            counts = touches.setdefault(src, {})
+            counts[c] = counts.get(c, 0) + 1
+    for src, counts in touches.items():
+        comm_of[src] = max(counts, key=counts.get)
+
+    n_addr, n_contrib = {}, {}
+    for r in nodes_records:
+        c = comm_of.get(r[0])
+        if c is not None:
+            tally = n_addr if r[2] == "address" else n_contrib
+            tally[c] = tally.get(c, 0) + 1
+    # "address" type so both renderers pick their highlighted node style
+    meta_nodes = tuple(
+        (f"comm:{i}", f"Community {i}", "address",
+         f"{n_addr.get(i, 0)} addresses • {n_contrib.get(i, 0)} contributors")
+        for i in range(len(communities))
+    )
+
+    inter = {}
+    for src, dst, _, _ in edges_records:
+        cs, cd = comm_of.get(src), comm_of.get(dst)
+        if cs is not None and cd is not None and cs != cd:
+            key = (min(cs, cd), max(cs, cd))
+            inter[key] = inter.get(key, 0) + 1
+    meta_edges = tuple(
+        (f"comm:{a}", f"comm:{b}", f"{n} cross-community links", n)
+        for (a, b), n in inter.items()
+    )
+    return meta_nodes, meta_edges, comm_of
+
+@st.cache_data
+def build_sigma_html(nodes_records, edges_records, h, w) -> str:
+    """WebGL fallback for graphs too large for vis.js.
+
+    Same record layout as build_network_html; nodes/edges are serialized in
+    one shot through pandas' C-level to_json rather than per-node Python
+    calls, and sigma draws them on a GPU canvas.
+    """
+    G = nx.Graph()
+    G.add_nodes_from(r[0] for r in nodes_records)
+    G.add_edges_from((src, dst) for src, dst, _, _ in edges_records)
+    pos = nx.spring_layout(G, seed=0, iterations=50)
+
+    ndf = pd.DataFrame(nodes_records, columns=["id", "label", "type", "title"])
+    coords = np.array([pos[i] for i in ndf["id"]], dtype=float).reshape(-1, 2)
+    ndf["x"] = coords[:, 0]
+    ndf["y"] = coords[:, 1]
+    ndf["size"] = np.where(ndf["type"] == "address", 6, 3)
+    ndf["color"] = np.where(ndf["type"] == "address", "#d62728", "#1f77b4")
+    edf = pd.DataFrame(edges_records, columns=["source", "target", "title", "tx_count"])
+    edf["size"] = np.log1p(edf["tx_count"].astype(float))
+
+    return SIGMA_TEMPLATE.render(
+        nodes_json=ndf[["id", "label", "x", "y", "size", "color"]].to_json(orient="records"),
+        edges_json=edf[["source", "target", "size"]].to_json(orient="records"),
+        h=h, w=w,
+    )
+
 def ensure_artifacts():
     """Run prep once if nodes/edges don't exist (optional)."""
     if not (DEFAULT_NODES.exists() and DEFAULT_EDGES.exists()):
@@ -83,21 +296,22 @@ with st.sidebar:
         graph_w = st.slider("Graph width (px)", 600, 1800, 1200, 50)
 
 # ---------- Filtering ----------
-addr_contribs = edges.groupby("target").agg(contributors=("source", "nunique")).reset_index()
-addr_keep = set(addr_contribs.loc[addr_contribs["contributors"] >= min_contribs, "target"])
-
-is_addr = nodes["type"] == "address"
-is_person = nodes["type"] == "contributor"
+pre = precompute(nodes_path, edges_path,
+                 os.path.getmtime(nodes_path), os.path.getmtime(edges_path))
+addr_keep_mask = pre["keep_mask_by_min"][min_contribs][pre["id_codes"]]
+is_addr = pre["is_addr"]
+is_person = pre["is_person"]
 
 persons_ok = is_person
 if sel_types:
     persons_ok = is_person & nodes["contrib_type"].isin(sel_types)
 
-nodes_f = nodes[(is_addr & nodes["id"].isin(addr_keep)) | persons_ok].copy()
+# no .copy(): downstream only reads these; new columns go through .assign
+nodes_f = nodes[(is_addr & addr_keep_mask) | persons_ok]
 nodes_f = nodes_f[nodes_f["total_amount"].between(sel_amt[0], sel_amt[1])]
 
 keep_ids = set(nodes_f["id"])
-edges_f = edges[edges["source"].isin(keep_ids) & edges["target"].isin(keep_ids)].copy()
+edges_f = edges[edges["source"].isin(keep_ids) & edges["target"].isin(keep_ids)]
 
 # ---------- Header ----------
 st.title("Shared Address Links — Interactive")
@@ -112,41 +326,63 @@ with colA:
     st.metric("Contributors shown", n_people)
 
     st.markdown("**Top Shared Addresses** (by #contributors):")
+    # nlargest keeps a 12-row heap instead of sorting every address, and a
+    # dict lookup replaces the merge just to attach labels
     top = (
-        edges_f.groupby(["target"])
+        edges_f.groupby("target", observed=True)
         .agg(contributors=("source", "nunique"), tx=("source", "size"))
+        .nlargest(12, ["contributors", "tx"])
         .reset_index()
-        .merge(
-            nodes_f[nodes_f["type"] == "address"][["id", "label"]],
-            left_on="target",
-            right_on="id",
-            how="left",
-        )
-        .sort_values(["contributors", "tx"], ascending=False)
-        .head(12)[["label", "contributors", "tx"]]
     )
-    st.dataframe(top, hide_index=True, use_container_width=True)
+    addr_rows = nodes_f[nodes_f["type"] == "address"]
+    top["label"] = top["target"].map(dict(zip(addr_rows["id"], addr_rows["label"])))
+    st.dataframe(top[["label", "contributors", "tx"]],
+                 hide_index=True, use_container_width=True)
 
 # ---------- Network (full width, slider-controlled size) ----------
 st.subheader("Interactive Network")
-net = Network(height=f"{graph_h}px", width=f"{graph_w}px", bgcolor="#ffffff", font_color="#000000")
-net.barnes_hut(gravity=-20000, central_gravity=0.3, spring_length=150,
-               spring_strength=0.01, damping=0.09)
-
-# nodes
-for _, r in nodes_f.iterrows():
-    title = f"{'Address' if r['type']=='address' else r.get('contrib_type','Contributor')}"
-    title += f" • {int(r.get('tx_count',0))} tx • ${float(r.get('total_amount',0)):,.0f}"
-    if r["type"] == "address":
-        net.add_node(r["id"], label=r["label"], title=title, shape="square")
-    else:
-        net.add_node(r["id"], label=r["label"], title=title)
 
-# edges
-for _, e in edges_f.iterrows():
-    etitle = f"{e['address']} • {int(e['tx_count'])} tx • ${float(e['total_amount']):,.0f}"
-    net.add_edge(e["source"], e["target"], title=etitle, value=float(e["tx_count"]))
+# precompute titles vectorially (iterrows is the slow path)
+nodes_f = nodes_f.assign(title=(
+    np.where(nodes_f["type"].eq("address"), "Address",
+             nodes_f["contrib_type"].astype("string").fillna("Contributor"))
+    + " • "
+    + nodes_f["tx_count"].fillna(0).astype(int).astype(str)
+    + " tx • $"
+    + nodes_f["total_amount"].fillna(0).map("{:,.0f}".format)
+))
+
+edges_f = edges_f.assign(etitle=(
+    edges_f["address"].astype(str)
+    + " • "
+    + edges_f["tx_count"].astype(int).astype(str)
+    + " tx • $"
+    + edges_f["total_amount"].map("{:,.0f}".format)
+))
+
+# hashable records so st.cache_data can key on the exact filter state
+nodes_records = tuple(nodes_f[["id", "label", "type", "title"]].itertuples(index=False, name=None))
+edges_records = tuple(edges_f[["source", "target", "etitle", "tx_count"]].itertuples(index=False, name=None))
+# aggregated view for big graphs: show communities, drill into one on demand
+# (skip when no edges survive the filters — e.g. every address dropped via the
+# amount slider — since there is nothing to project communities from)
+if len(nodes_records) > COMMUNITY_NODE_THRESHOLD and edges_records:
+    meta_nodes, meta_edges, comm_of = collapse_communities(nodes_records, edges_records)
+    st.session_state["node_community"] = comm_of
+    labels = ["All communities (collapsed)"] + [m[1] for m in meta_nodes]
+    choice = st.selectbox("Community", labels,
+                          help="Graphs this size are collapsed into communities; "
+                               "pick one to see its members")
+    if choice == labels[0]:
+        nodes_records, edges_records = meta_nodes, meta_edges
+    else:
+        ci = labels.index(choice) - 1
+        members = {nid for nid, c in comm_of.items() if c == ci}
+        nodes_records = tuple(r for r in nodes_records if r[0] in members)
+        edges_records = tuple(e for e in edges_records if e[0] in members and e[1] in members)
 
-net.save_graph("network.html")
-with open("network.html", "r", encoding="utf-8") as f:
-    html(f.read(), height=graph_h + 40, width=graph_w, scrolling=True)
+if len(nodes_records) > SIGMA_NODE_THRESHOLD:
+    html_str = build_sigma_html(nodes_records, edges_records, graph_h, graph_w)
+else:
+    html_str = build_network_html(nodes_records, edges_records, graph_h, graph_w)
+html(html_str, height=graph_h + 40, width=graph_w, scrolling=True)
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from pathlib import Path
 import pandas as pd
 import numpy as np
@@ -9,18 +10,42 @@ DATA_DIR = BASE_DIR / "data"
 INPUT = DATA_DIR / "Cleaned_Full_Address_Contributions.csv"   # source csv,  <- use your cleaned file path
 OUT_DIR = DATA_DIR                                            # or BASE_DIR / "artifacts"
 N_MIN_AT_ADDRESS = 2                                        # min distinct contributors at an address
+CHUNK_ROWS = 500_000                                        # rows per streamed chunk
 # ---------------------------
 
 
-df = pd.read_csv(INPUT)
-# clean the Amount column as it is formatted as $
-df["Amount"] = (
-    df["Amount"]
-    .astype(str)                 # make sure it’s string
-    .str.replace("$", "", regex=False)  # remove dollar sign
-    .str.replace(",", "", regex=False)  # remove commas
-    .astype(float)               # convert to float
-)
+# pass 1: stream the file to find addresses with enough distinct contributors,
+# so pass 2 only ever keeps rows we actually use — peak memory is bounded by
+# the chunk size, not the input file
+contributors_at = defaultdict(set)
+for chunk in pd.read_csv(INPUT, chunksize=CHUNK_ROWS,
+                         usecols=["Contributor Name", "full_address"],
+                         dtype={"Contributor Name": "string", "full_address": "string"}):
+    for addr, names in chunk.groupby("full_address")["Contributor Name"].agg(set).items():
+        contributors_at[addr].update(names)
+shared_addrs = {a for a, s in contributors_at.items() if len(s) >= N_MIN_AT_ADDRESS}
+del contributors_at
+
+# pass 2: filter each chunk, concat once at the end (never concat in a loop);
+# explicit dtypes skip inference, Contributor Type becomes categorical after
+# the concat so chunk category sets can't disagree
+parts = []
+for chunk in pd.read_csv(INPUT, chunksize=CHUNK_ROWS,
+                         usecols=["Contributor Name", "Contributor Type",
+                                  "full_address", "Amount"],
+                         dtype={"Contributor Name": "string", "Contributor Type": "string",
+                                "full_address": "string"}):
+    part = chunk[chunk["full_address"].isin(shared_addrs)]
+    if len(part):
+        parts.append(part)
+df = pd.concat(parts, ignore_index=True)
+df["Contributor Type"] = df["Contributor Type"].astype("category")
+# clean the Amount column as it is formatted as $ — one regex pass instead of
+# chained replaces (each chained .str call allocates a fresh object array)
+df["Amount"] = pd.to_numeric(
+    df["Amount"].astype("string").str.replace(r"[$,]", "", regex=True),
+    errors="coerce", downcast="float",
+).fillna(0.0)
 
 
 # sanity: required cols
@@ -35,14 +60,18 @@ if "Amount" not in df.columns:
 if "Date" in df.columns:
     df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
 
-# exact grouping by address (use your existing 'group_id' if already present)
-if "group_id" not in df.columns:
-    df["group_id"] = pd.factorize(df["full_address"])[0]
+# exact grouping by address — the categorical builds the string hash table
+# once, and group_id plus every later groupby on full_address reuse its codes
+df["full_address"] = df["full_address"].astype("category")
+df["group_id"] = df["full_address"].cat.codes
 
-# stats per address
-addr_stats = (df.groupby(["group_id", "full_address"], as_index=False)
+# stats per address — nunique skips NaN, but a missing contributor name still
+# counts as one distinct contributor here (as the original unique()-based
+# counting did), so aggregate over a sentinel-filled copy of the name column
+addr_stats = (df.assign(name_key=df["Contributor Name"].fillna("(missing)"))
+                .groupby(["group_id", "full_address"], as_index=False, observed=True)
                 .agg(
-                    contributors=("Contributor Name", lambda s: pd.Series(s.unique()).size),
+                    contributors=("name_key", "nunique"),
                     total_amount=("Amount", "sum"),
                     tx_count=("Contributor Name", "size")
                 ))
@@ -55,20 +84,31 @@ df_shared = df[df["group_id"].isin(shared_addr_ids)].copy()
 df_shared["contrib_id"] = "person:" + pd.factorize(df_shared["Contributor Name"])[0].astype(str)
 df_shared["address_id"] = "addr:" + df_shared["group_id"].astype(str)
 
+# one full hash pass at edge granularity; the node tables then reduce from
+# this much smaller intermediate instead of each re-hashing df_shared
+# (dropna=False keeps rows with a missing Contributor Type in the edges)
+edge_stats = (df_shared.groupby(
+                  ["contrib_id", "address_id", "full_address",
+                   "Contributor Name", "Contributor Type"],
+                  as_index=False, observed=True, dropna=False)
+              .agg(tx_count=("Amount", "size"),
+                   total_amount=("Amount", "sum")))
+
 # contributor nodes
-nodes_contrib = (df_shared.groupby(["contrib_id", "Contributor Name", "Contributor Type"], as_index=False)
-                 .agg(total_amount=("Amount", "sum"),
-                      tx_count=("full_address", "size")))
+nodes_contrib = (edge_stats.groupby(["contrib_id", "Contributor Name", "Contributor Type"],
+                                    as_index=False, observed=True)
+                 .agg(total_amount=("total_amount", "sum"),
+                      tx_count=("tx_count", "sum")))
 
 nodes_contrib.rename(columns={"Contributor Name": "label",
                               "Contributor Type": "contrib_type"}, inplace=True)
 nodes_contrib["type"] = "contributor"
 
 # address nodes
-nodes_addr = (df_shared.groupby(["address_id", "full_address"], as_index=False)
-              .agg(contributors=("Contributor Name", lambda s: pd.Series(s.unique()).size),
-                   total_amount=("Amount", "sum"),
-                   tx_count=("full_address", "size")))
+nodes_addr = (edge_stats.groupby(["address_id", "full_address"], as_index=False, observed=True)
+              .agg(contributors=("contrib_id", "nunique"),
+                   total_amount=("total_amount", "sum"),
+                   tx_count=("tx_count", "sum")))
 nodes_addr.rename(columns={"full_address": "label"}, inplace=True)
 nodes_addr["type"] = "address"
 nodes_addr["contrib_type"] = np.nan  # n/a
@@ -80,9 +120,10 @@ nodes = pd.concat([
 ], ignore_index=True)
 
 # edges: contributor -> address (bipartite)
-edges = (df_shared.groupby(["contrib_id", "address_id", "full_address"], as_index=False)
-         .agg(tx_count=("Contributor Name", "size"),
-              total_amount=("Amount", "sum")))
+edges = (edge_stats.groupby(["contrib_id", "address_id", "full_address"],
+                            as_index=False, observed=True)
+         .agg(tx_count=("tx_count", "sum"),
+              total_amount=("total_amount", "sum")))
 edges.rename(columns={"contrib_id": "source", "address_id": "target"}, inplace=True)
 edges["edge_type"] = "at_address"
 edges["address"] = edges["full_address"]
@@ -92,8 +133,20 @@ edges = edges[["source", "target", "edge_type", "address", "tx_count", "total_am
 top_shared = (addr_stats[addr_stats["group_id"].isin(shared_addr_ids)]
               .sort_values(["contributors", "total_amount"], ascending=[False, False]))
 
+# categoricals round-trip through parquet, so the app loads typed columns
+# with zero parsing
+nodes["type"] = nodes["type"].astype("category")
+nodes["contrib_type"] = nodes["contrib_type"].astype("category")
+for col in ("source", "target", "edge_type"):
+    edges[col] = edges[col].astype("category")
+
+# float32/int32 halve the bytes the app scans when filtering these columns
+for frame in (nodes, edges):
+    frame["total_amount"] = frame["total_amount"].astype("float32")
+    frame["tx_count"] = frame["tx_count"].astype("int32")
+
 OUT_DIR.mkdir(parents=True, exist_ok=True)
-(nodes).to_csv(OUT_DIR / "nodes.csv", index=False)
-(edges).to_csv(OUT_DIR / "edges.csv", index=False)
+(nodes).to_parquet(OUT_DIR / "nodes.parquet", compression="zstd", index=False)
+(edges).to_parquet(OUT_DIR / "edges.parquet", compression="zstd", index=False)
 (top_shared).to_csv(OUT_DIR / "top_shared_addresses.csv", index=False)
-print(f"Wrote: {OUT_DIR/'nodes.csv'} , {OUT_DIR/'edges.csv'} and {OUT_DIR / 'top_shared_addresses.csv'}")
+print(f"Wrote: {OUT_DIR/'nodes.parquet'} , {OUT_DIR/'edges.parquet'} and {OUT_DIR / 'top_shared_addresses.csv'}")